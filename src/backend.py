@@ -8,9 +8,10 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from whoosh.index import open_dir
 from whoosh.qparser import MultifieldParser
 
+from src.whoosh_storage import MemoryViewStorage
+
 app = FastAPI()
 
 # Serve the Svelte app
@@ -129,7 +130,8 @@ async def search_products(
             status_code=404, detail=f"Search index not found for {table_name}"
         )
 
-    ix = open_dir(index_dir)
+    # Read segments straight from the memory map rather than copying them
+    ix = MemoryViewStorage(index_dir, readonly=True).open_index()
 
     # Get only searchable fields from the schema (those with a format/analyzer)
     searchable_fields = [
@@ -2,11 +2,21 @@ import argparse
 import asyncio
 import logging
 import os
+import random
+import re
+from functools import lru_cache
+from typing import Optional
 
+import google_crc32c
 from asyncer import asyncify
 from dotenv import load_dotenv
+from google.api_core.exceptions import ServerError, TooManyRequests
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from google.cloud.storage.blob import Blob
+from requests.adapters import HTTPAdapter
+
+from utils import run_async_main
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,46 +26,202 @@ logging.basicConfig(
 # Suppress google-cloud-storage logging
 logging.getLogger("google.resumable_media._helpers").setLevel(logging.WARNING)
 
+SNAPSHOT_PATTERN = re.compile(r"snapshot=(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2})")
+
+# Listings only fetch the blob metadata needed to decide what to download
+LIST_PAGE_SIZE = 1000
+LIST_BLOB_FIELDS = "items(name,size,crc32c,generation,updated),nextPageToken"
+# Sidecar objects (_SUCCESS, manifests, ...) are filtered out by the API
+LIST_BLOB_GLOB = "**/*.parquet"
+
+# Blobs at least this large are fetched as parallel ranged requests
+LARGE_BLOB_SIZE = 128 * 1024 * 1024
+LARGE_BLOB_CHUNK_SIZE = 32 * 1024 * 1024
+LARGE_BLOB_WORKERS = 8
+
+# CRC32C is only cheap with the C extension; the pure-Python fallback is slow
+# enough to cap download throughput, so use MD5 (hashlib) for whole-blob
+# downloads instead
+FAST_CRC32C = google_crc32c.implementation == "c"
+
+# Downloads failing with these are retried; a retry rewrites the file from scratch
+RETRYABLE_ERRORS = (ServerError, TooManyRequests)
+DOWNLOAD_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+
+@lru_cache(maxsize=None)
+def get_storage_client(pool_size: int) -> storage.Client:
+    """
+    Return a storage client whose HTTP connection pool holds `pool_size`
+    connections. Clients are cached, so repeated downloads in one process reuse
+    the client and its open connections.
+    """
+    client = storage.Client()
+    # requests keeps only 10 connections per host by default, which throttles
+    # concurrent downloads; leave custom (e.g. mutual TLS) adapters alone
+    if type(client._http.get_adapter("https://")) is HTTPAdapter:
+        client._http.mount(
+            "https://",
+            HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size),
+        )
+    return client
+
 
 async def download_blob(
-    blob: Blob, download_path: str, semaphore: asyncio.Semaphore, position: int
+    blob: Blob,
+    dest_path: str,
+    semaphore: asyncio.Semaphore,
+    position: int,
+    verify_checksum: bool = True,
 ) -> None:
     async with semaphore:
-        full_path = os.path.join(download_path, os.path.dirname(blob.name))
-        os.makedirs(full_path, exist_ok=True)
-        dest_path = os.path.join(download_path, blob.name)
+        # Write to a side file and only move it into place once the download
+        # succeeded, so a failed or corrupt download never looks up to date
+        part_path = f"{dest_path}.part"
+        try:
+            if blob.size >= LARGE_BLOB_SIZE:
+                await download_blob_in_chunks(blob, part_path, verify_checksum)
+            else:
+                await download_blob_in_one_stream(
+                    blob, part_path, position, verify_checksum
+                )
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, dest_path)
+
+
+async def download_blob_in_chunks(
+    blob: Blob, dest_path: str, verify_checksum: bool
+) -> None:
+    # A single stream cannot saturate the link for large shards, so split them
+    # into chunks fetched concurrently and written in place
+    logger.info(
+        f"Downloading {os.path.basename(blob.name)} "
+        f"({blob.size / (1024 * 1024):.2f} MB) in parallel chunks"
+    )
+    await asyncify(transfer_manager.download_chunks_concurrently)(
+        blob,
+        dest_path,
+        chunk_size=LARGE_BLOB_CHUNK_SIZE,
+        max_workers=LARGE_BLOB_WORKERS,
+        worker_type=transfer_manager.THREAD,
+        # Chunks can only be validated with CRC32C, combined per chunk
+        crc32c_checksum=verify_checksum and FAST_CRC32C,
+    )
 
-        from tqdm import tqdm
 
-        CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+async def download_blob_in_one_stream(
+    blob: Blob, dest_path: str, position: int, verify_checksum: bool
+) -> None:
+    from tqdm import tqdm
 
-        # Create progress bar for this file
-        desc = f"Downloading {os.path.basename(blob.name)}"
-        with tqdm(
+    # Stream the whole blob in a single request, updating the progress bar as
+    # each piece is written, rather than issuing one ranged GET per chunk
+    desc = f"Downloading {os.path.basename(blob.name)}"
+    with (
+        open(dest_path, "wb") as f,
+        tqdm.wrapattr(
+            f,
+            "write",
             total=blob.size,
-            unit="B",
-            unit_scale=True,
             desc=desc.ljust(50)[:50],  # Pad description for alignment
             leave=True,  # Keep the progress bar after completion
             dynamic_ncols=True,  # Adapt to terminal width
             position=position,  # Use passed position
             miniters=1,  # Update at least every iteration
             ascii=False,  # Use ASCII characters for the progress bar
-        ) as pbar:
-            # Download the blob in chunks
-            start = 0
-            end = blob.size - 1
-
-            with open(dest_path, "wb") as f:
-                while start <= end:
-                    chunk_end = min(start + CHUNK_SIZE - 1, end)
-                    chunk = await asyncify(blob.download_as_bytes)(
-                        start=start, end=chunk_end
-                    )
-                    f.write(chunk)
-                    chunk_size = len(chunk)
-                    pbar.update(chunk_size)
-                    start += chunk_size
+        ) as pbar_file,
+    ):
+        checksum = None
+        if verify_checksum:
+            checksum = "crc32c" if FAST_CRC32C else "md5"
+        await asyncify(blob.download_to_file)(pbar_file, checksum=checksum)
+
+
+async def find_latest_snapshot_prefix(
+    bucket: storage.Bucket, prefix: str
+) -> Optional[str]:
+    def list_snapshot_prefixes() -> set[str]:
+        # A delimited listing returns only the snapshot "directories" under the
+        # catalog, so the latest one is known without listing every object
+        iterator = bucket.list_blobs(
+            prefix=prefix,
+            delimiter="/",
+            page_size=LIST_PAGE_SIZE,
+            fields="prefixes,nextPageToken",
+        )
+        for _ in iterator.pages:
+            pass
+        return iterator.prefixes
+
+    def has_parquet_files(snapshot_prefix: str) -> bool:
+        # A snapshot still being written (or holding only sidecar files) has
+        # no parquet objects yet; one matching name is enough to tell
+        iterator = bucket.list_blobs(
+            prefix=snapshot_prefix,
+            match_glob=LIST_BLOB_GLOB,
+            max_results=1,
+            fields="items(name)",
+        )
+        return any(True for _ in iterator)
+
+    snapshot_prefixes = sorted(
+        (
+            snapshot_prefix
+            for snapshot_prefix in await asyncify(list_snapshot_prefixes)()
+            if SNAPSHOT_PATTERN.search(snapshot_prefix)
+        ),
+        key=lambda snapshot_prefix: SNAPSHOT_PATTERN.search(snapshot_prefix).group(1),
+        reverse=True,
+    )
+    # Newest first, skipping snapshots without any parquet files
+    for snapshot_prefix in snapshot_prefixes:
+        if await asyncify(has_parquet_files)(snapshot_prefix):
+            return snapshot_prefix
+    return None
+
+
+async def find_latest_snapshot_url(
+    *, octogen_catalog_bucket: str, octogen_customer_name: str, catalog: str
+) -> Optional[str]:
+    """Return the gs:// URL of the catalog's latest snapshot, or None if it has none."""
+    prefix = f"{octogen_customer_name}/catalog={catalog}/"
+    bucket = get_storage_client(LARGE_BLOB_WORKERS).bucket(octogen_catalog_bucket)
+    snapshot_prefix = await find_latest_snapshot_prefix(bucket, prefix)
+    if snapshot_prefix is None:
+        return None
+    return f"gs://{octogen_catalog_bucket}/{snapshot_prefix}"
+
+
+async def download_blob_with_retry(
+    blob: Blob,
+    dest_path: str,
+    semaphore: asyncio.Semaphore,
+    position: int,
+    verify_checksum: bool = True,
+) -> None:
+    """download_blob, retrying transient GCS errors with jittered exponential backoff."""
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        try:
+            await download_blob(
+                blob, dest_path, semaphore, position, verify_checksum=verify_checksum
+            )
+            return
+        except RETRYABLE_ERRORS as e:
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+            # Full jitter keeps concurrent retries from hitting GCS in lockstep
+            delay = random.uniform(
+                0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt)
+            )
+            logger.warning(
+                f"Retrying {blob.name} in {delay:.1f}s after attempt {attempt + 1} failed: {e}"
+            )
+            await asyncio.sleep(delay)
 
 
 async def download_catalog(
@@ -64,82 +230,106 @@ async def download_catalog(
     octogen_customer_name: str,
     catalog: str,
     download_path: str,
-    max_concurrent: int = 4,
+    max_concurrent: int = 16,
+    latest_snapshot_only: bool = True,
+    force: bool = False,
+    verify_checksums: bool = True,
 ) -> None:
     prefix = f"{octogen_customer_name}/catalog={catalog}/"
     logger.info(
         f"Downloading catalog from gs://{octogen_catalog_bucket}/{prefix} to {download_path}"
     )
 
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(octogen_catalog_bucket)
-    blobs = await asyncify(bucket.list_blobs)(prefix=prefix)
+    if verify_checksums and not FAST_CRC32C:
+        logger.warning(
+            "google-crc32c C extension is not available; verifying downloads with "
+            "MD5 and skipping checksums of chunked downloads"
+        )
 
-    # Convert to list and filter for .parquet files and snapshots
-    blobs = [blob for blob in blobs if blob.name.endswith(".parquet")]
+    # Every concurrent download may be a chunked one using several connections
+    storage_client = get_storage_client(max_concurrent * LARGE_BLOB_WORKERS)
+    bucket = storage_client.bucket(octogen_catalog_bucket)
 
-    # Extract snapshots and find the latest one
-    import re
+    if latest_snapshot_only:
+        snapshot_prefix = await find_latest_snapshot_prefix(bucket, prefix)
+        if snapshot_prefix is None:
+            logger.error("No snapshot files found in the catalog")
+            return
 
-    snapshot_pattern = r"snapshot=(\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2})"
-    snapshot_blobs = [blob for blob in blobs if "snapshot=" in blob.name]
+        latest_snapshot = SNAPSHOT_PATTERN.search(snapshot_prefix).group(1)
+        logger.info(f"Found latest snapshot: {latest_snapshot}")
+        prefix = snapshot_prefix
 
-    if not snapshot_blobs:
-        logger.error("No snapshot files found in the catalog")
-        return
+    # Only request the metadata the downloads need, and walk the listing page by
+    # page so downloads start as soon as the first page arrives
+    pages = bucket.list_blobs(
+        prefix=prefix,
+        match_glob=LIST_BLOB_GLOB,
+        page_size=LIST_PAGE_SIZE,
+        fields=LIST_BLOB_FIELDS,
+    ).pages
 
-    # Find the latest snapshot
-    latest_snapshot = max(
-        re.search(snapshot_pattern, blob.name).group(1) for blob in snapshot_blobs
-    )
-    logger.info(f"Found latest snapshot: {latest_snapshot}")
-
-    # Filter for only the latest snapshot
-    blobs = [
-        blob for blob in snapshot_blobs if f"snapshot={latest_snapshot}" in blob.name
-    ]
-
-    # Filter out files that already exist with matching size
-    blobs_to_download = []
-    for blob in blobs:
-        local_path = os.path.join(download_path, blob.name)
-        if os.path.exists(local_path):
-            local_size = os.path.getsize(local_path)
-            if local_size == blob.size:
-                logger.debug(
-                    f"Skipping {blob.name} - already exists with matching size"
-                )
-                continue
-            else:
-                logger.debug(
-                    f"Re-downloading {blob.name} - size mismatch (local: {local_size}, remote: {blob.size})"
-                )
-        blobs_to_download.append(blob)
+    # Create a semaphore to limit concurrent downloads
+    semaphore = asyncio.Semaphore(max_concurrent)
 
-    total_size = sum(blob.size for blob in blobs_to_download)
-    logger.info(
-        f"Found {len(blobs_to_download)} files to download out of {len(blobs)} total. "
-        f"Total download size: {total_size / (1024*1024):.2f} MB"
-    )
+    scheduled = 0
+    total_blobs = 0
+    total_size = 0
+    # Blobs share a few snapshot directories, so create each one only once
+    created_dirs: set[str] = set()
+    # The first download that still fails after its retries cancels the listing
+    # and every download still waiting for a slot; it surfaces as an ExceptionGroup
+    async with asyncio.TaskGroup() as task_group:
+        while (page := await asyncify(next)(pages, None)) is not None:
+            # Resolve each blob's local path once; it is used for the up-to-date
+            # check, the directory and the download itself
+            targets = [(blob, os.path.join(download_path, blob.name)) for blob in page]
+            for blob, local_path in targets:
+                total_blobs += 1
 
-    if not blobs_to_download:
-        logger.info("All files are already downloaded and up to date!")
-        return
+                # Skip files that were already downloaded since the blob last changed
+                if not force and os.path.exists(local_path):
+                    local_stat = os.stat(local_path)
+                    if local_stat.st_size == blob.size and (
+                        blob.updated is None
+                        or local_stat.st_mtime >= blob.updated.timestamp()
+                    ):
+                        logger.debug(
+                            f"Skipping {blob.name} - already exists and up to date"
+                        )
+                        continue
+                    else:
+                        logger.debug(
+                            f"Re-downloading {blob.name} - size or update time mismatch (local: {local_stat.st_size}, remote: {blob.size})"
+                        )
 
-    # Create a semaphore to limit concurrent downloads
-    semaphore = asyncio.Semaphore(max_concurrent)
+                total_size += blob.size
+                blob_dir = os.path.dirname(local_path)
+                if blob_dir not in created_dirs:
+                    os.makedirs(blob_dir, exist_ok=True)
+                    created_dirs.add(blob_dir)
+                task_group.create_task(
+                    download_blob_with_retry(
+                        blob,
+                        local_path,
+                        semaphore,
+                        scheduled,
+                        verify_checksum=verify_checksums,
+                    )
+                )
+                scheduled += 1
 
-    # Create download tasks for each blob
-    tasks = []
-    for i, blob in enumerate(blobs_to_download):
-        task = download_blob(blob, download_path, semaphore, i)
-        tasks.append(task)
+        logger.info(
+            f"Found {scheduled} files to download out of {total_blobs} total. "
+            f"Total download size: {total_size / (1024 * 1024):.2f} MB"
+        )
 
-    # Run downloads concurrently
-    await asyncio.gather(*tasks)
+        if not scheduled:
+            logger.info("All files are already downloaded and up to date!")
 
 
-async def main() -> None:
+async def main(all_snapshots: bool = False) -> None:
+    """Command line entry point; all_snapshots is the default for --all-snapshots."""
     parser = argparse.ArgumentParser(description="Octogen Catalog Tools")
     parser.add_argument(
         "--catalog",
@@ -153,6 +343,24 @@ async def main() -> None:
         help="Path where catalog files will be downloaded",
         required=True,
     )
+    parser.add_argument(
+        "--all-snapshots",
+        action="store_true",
+        default=all_snapshots,
+        help="Download every snapshot instead of only the latest one",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="Re-download files even if an up-to-date local copy exists",
+    )
+    parser.add_argument(
+        "--no-checksum",
+        action="store_true",
+        default=False,
+        help="Skip checksum validation of downloaded files",
+    )
     args = parser.parse_args()
 
     if not load_dotenv():
@@ -177,8 +385,11 @@ async def main() -> None:
         octogen_customer_name=octogen_customer_name,
         catalog=args.catalog,
         download_path=args.download,
+        latest_snapshot_only=not args.all_snapshots,
+        force=args.force,
+        verify_checksums=not args.no_checksum,
     )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async_main(main)
@@ -2,11 +2,12 @@ import argparse
 import json
 import os
 import sys
+from typing import Optional
 
 import duckdb
 from whoosh.analysis import StemmingAnalyzer
 from whoosh.fields import ID, KEYWORD, NUMERIC, STORED, TEXT, Schema
-from whoosh.index import create_in
+from whoosh.filedb.filestore import FileStorage
 
 # Add the src directory to the system path
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
@@ -53,28 +54,74 @@ schema = Schema(
 )
 
 
+# Default memory budget for one batch of documents read from DuckDB
+DEFAULT_INDEX_BATCH_BYTES = 50 * 1024 * 1024
+MIN_INDEX_BATCH_SIZE = 128
+
+
+def estimate_batch_size(
+    conn: duckdb.DuckDBPyConnection,
+    table_name: str,
+    max_batch_bytes: int = DEFAULT_INDEX_BATCH_BYTES,
+) -> int:
+    """Derive an indexing batch size from the average size of a sample of products"""
+    avg_product_bytes = conn.execute(f"""
+        SELECT avg(strlen(extracted_product::VARCHAR))
+        FROM {table_name}_extracted
+        USING SAMPLE 500 ROWS
+    """).fetchone()[0]
+    return max(
+        MIN_INDEX_BATCH_SIZE, int(max_batch_bytes / max(1, avg_product_bytes or 0))
+    )
+
+
 def create_whoosh_index(
-    db_path: str, index_dir: str, table_name: str, batch_size: int = 1000
+    db_path: str,
+    index_dir: str,
+    table_name: str,
+    batch_size: int = 1000,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+    procs: int = 1,
+    storage: Optional[FileStorage] = None,
 ):
-    """Create a Whoosh index from DuckDB database contents"""
+    """Create a Whoosh index from DuckDB database contents
+
+    An open connection can be passed in to read from a database that other
+    connections in this process are still writing to; it is not closed here.
+
+    With procs > 1, documents are analyzed and written by that many worker
+    processes (forked, so only use this where forking is safe), and their
+    segments are merged on commit.
+
+    The index is written to `storage` if given (e.g. a MemoryViewStorage),
+    otherwise to a plain FileStorage over index_dir.
+    """
     if not index_dir:
         index_dir = f"/tmp/whoosh/{table_name}"
     if not db_path:
         db_path = f"{table_name}_catalog.duckdb"
-    if not os.path.exists(db_path):
+    if conn is None and not os.path.exists(db_path):
         print(f"Database file {db_path} does not exist")
         return
 
-    conn = duckdb.connect(db_path)
-    cursor = conn
+    owns_connection = conn is None
+    if owns_connection:
+        conn = duckdb.connect(db_path)
+    cursor = conn.cursor()
 
     # Create the index directory if it doesn't exist
     if not os.path.exists(index_dir):
         os.makedirs(index_dir)
 
     # Create a Whoosh index
-    ix = create_in(index_dir, schema)
-    writer = ix.writer()
+    if storage is None:
+        storage = FileStorage(index_dir)
+    ix = storage.create_index(schema)
+    if procs > 1:
+        # The per-process segments are merged into one when the writer commits
+        writer = ix.writer(procs=procs)
+    else:
+        writer = ix.writer()
 
     try:
         # Get total count of rows
@@ -82,14 +129,23 @@ def create_whoosh_index(
 
         print(f"Found {total_rows} products to index")
 
-        # Process in batches
-        for offset in range(0, total_rows, batch_size):
-            # Modified query to use extracted table with pre-extracted price fields
-            rows = cursor.execute(f"""
-                SELECT e.extracted_product, e.price, e.original_price 
-                FROM {table_name}_extracted e 
-                LIMIT {batch_size} OFFSET {offset}
-            """).fetchall()
+        # Stream the extracted table (with its pre-extracted price fields) from a
+        # single query as Arrow record batches, rather than one LIMIT/OFFSET query
+        # per batch that rescans every row before the offset
+        result = cursor.execute(f"""
+            SELECT e.extracted_product, e.price, e.original_price
+            FROM {table_name}_extracted e
+        """)
+        # fetch_record_batch is deprecated in favour of to_arrow_reader from
+        # DuckDB 1.5 on; older releases only have the former
+        if hasattr(result, "to_arrow_reader"):
+            batches = result.to_arrow_reader(batch_size)
+        else:
+            batches = result.fetch_record_batch(batch_size)
+
+        indexed_rows = 0
+        for batch in batches:
+            rows = zip(*(column.to_pylist() for column in batch.columns))
 
             for row in rows:
                 try:
@@ -188,9 +244,8 @@ def create_whoosh_index(
                     print(f"Error processing product: {e}")
                     continue
 
-            print(
-                f"Indexed {min(offset + batch_size, total_rows)} of {total_rows} products into {index_dir}"
-            )
+            indexed_rows += batch.num_rows
+            print(f"Indexed {indexed_rows} of {total_rows} products into {index_dir}")
 
         writer.commit()
         print("Indexing completed successfully")
@@ -199,7 +254,9 @@ def create_whoosh_index(
         print(f"Error during indexing: {e}")
         writer.cancel()
     finally:
-        conn.close()
+        cursor.close()
+        if owns_connection:
+            conn.close()
 
 
 def main():
@@ -214,9 +271,18 @@ def main():
     parser.add_argument(
         "--batch_size", type=int, help="Batch size for indexing", default=1000
     )
+    parser.add_argument(
+        "--procs", type=int, help="Number of indexing processes", default=1
+    )
     args = parser.parse_args()
 
-    create_whoosh_index(args.db_path, args.index_dir, args.table_name, args.batch_size)
+    create_whoosh_index(
+        args.db_path,
+        args.index_dir,
+        args.table_name,
+        args.batch_size,
+        procs=args.procs,
+    )
 
 
 if __name__ == "__main__":
@@ -1,13 +1,16 @@
 import argparse
 import datetime
-import glob
-import json
 import logging
 import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
 
 import duckdb
 import numpy as np
+import orjson
 import pandas as pd
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 
 from utils import get_catalog_db_path
@@ -18,25 +21,118 @@ logging.basicConfig(
 )
 
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, (np.integer, np.int32, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.float32, np.float64)):
-            return float(obj)
-        elif isinstance(obj, np.bool_):
-            return bool(obj)
-        elif isinstance(obj, (datetime.datetime, datetime.date)):
-            return obj.isoformat()
-        return super(NumpyEncoder, self).default(obj)
+# Bulk-load settings: scan and deduplicate on every core, and let DuckDB drop
+# insertion order (the loaders dedup explicitly and never rely on row order).
+# memory_limit is left at DuckDB's default (80% of RAM) unless overridden.
+DUCKDB_CONFIG = {
+    "allow_unsigned_extensions": "true",
+    "threads": str(os.cpu_count() or 1),
+    "preserve_insertion_order": "false",
+    "enable_object_cache": "true",
+}
+
+
+def duckdb_config(
+    memory_limit: Optional[str] = None,
+    threads: Optional[int] = None,
+    temp_directory: Optional[str] = None,
+) -> dict[str, str]:
+    """Return DUCKDB_CONFIG with any of the given settings overridden."""
+    config = dict(DUCKDB_CONFIG)
+    if memory_limit:
+        config["memory_limit"] = memory_limit
+    if threads:
+        config["threads"] = str(threads)
+    if temp_directory:
+        # Lets joins, sorts and windows spill to disk past memory_limit
+        config["temp_directory"] = temp_directory
+    return config
+
+
+# Rows of {table}_extracted before deduplication: the raw JSON from raw_products plus
+# commonly used fields pre-extracted from it, and where in the source files it came from. Each document is parsed once, pulling
+# every path in a single json_extract_string call that returns a list of values.
+EXTRACTED_PRODUCTS_SQL = """
+    SELECT
+        catalog,
+        -- Store extracted_product as is (already JSON string)
+        extracted_product,
+        fields[1] as product_group_id,
+        -- Pre-extract commonly used fields
+        fields[2] as product_id,
+        fields[3] as brand_name,
+        fields[4] as name,
+        fields[5] as description,
+        fields[6] as product_image,
+        -- Price and original price (if available) from first variant's first offer
+        TRY_CAST(fields[7] AS FLOAT) as price,
+        TRY_CAST(fields[8] AS FLOAT) as original_price,
+        -- Rating information
+        TRY_CAST(fields[9] AS FLOAT) as rating,
+        TRY_CAST(fields[10] AS INTEGER) as rating_count,
+        filename,
+        file_row_number
+    FROM (
+        SELECT
+            catalog,
+            extracted_product,
+            filename,
+            file_row_number,
+            json_extract_string(extracted_product, [
+                '$.productGroupID',
+                '$.id',
+                '$.brand.name',
+                '$.name',
+                '$.description',
+                '$.image',
+                '$.hasVariant[0].offers[0].priceSpecification.price',
+                '$.hasVariant[0].offers[0].priceSpecification.originalPrice',
+                '$.review[0].reviewRating.ratingValue',
+                '$.review[0].reviewRating.ratingCount'
+            ]) as fields
+        FROM raw_products
+    )
+"""
+
+# Parquet columns read by the crawl loader; anything else in the files is skipped
+CRAWL_COLUMNS = [
+    "catalog",
+    "product_url",
+    "crawl_url",
+    "page_content",
+    "crawl_timestamp",
+    "crawl_source",
+    "api_source",
+    "octogen_catalog",
+]
+
+# orjson serializes numpy scalars/arrays and datetimes natively
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+
+
+def orjson_default(obj: Any) -> Any:
+    """Convert values orjson cannot serialize natively."""
+    if isinstance(obj, np.ndarray):
+        # Object arrays, e.g. lists of structs read from parquet
+        return obj.tolist()
+    elif isinstance(obj, datetime.datetime):
+        # pandas Timestamp and NaT
+        return obj.isoformat()
+    raise TypeError
+
+
+def product_to_json(product: Any) -> str:
+    """Serialize a product to a JSON string; strings are assumed to be JSON already."""
+    if isinstance(product, str):
+        return product
+    return orjson.dumps(product, default=orjson_default, option=ORJSON_OPTIONS).decode()
 
 
 def create_nested_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """
     Create a nested DataFrame with standardized columns regardless of input format.
-    Handles both flattened and non-flattened data.
+    Handles both flattened and non-flattened data. The catalog column holds only a
+    handful of distinct names, so it is stored as a categorical.
     """
     new_df = pd.DataFrame()
     flattened = is_data_flattened(df)
@@ -44,33 +140,94 @@ def create_nested_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     if flattened:
         logger.info("Processing flattened data")
         # For flattened data, we need to create the extracted_product from all columns
-        new_df["extracted_product"] = df.apply(
-            lambda x: json.dumps(x.to_dict(), cls=NumpyEncoder), axis=1
-        )
-        new_df["catalog"] = df["catalog"]
-        new_df["product_group_id"] = df["productGroupID"]
+        new_df["extracted_product"] = [
+            product_to_json(record) for record in df.to_dict(orient="records")
+        ]
+        new_df["catalog"] = pd.Categorical(df["catalog"])
+        new_df["product_group_id"] = df["productGroupID"].values
     else:
         logger.info("Processing non-flattened data")
         # For non-flattened data, we already have extracted_product
-        new_df["extracted_product"] = df["extracted_product"].apply(
-            lambda x: x if isinstance(x, str) else json.dumps(x, cls=NumpyEncoder)
-        )
-        new_df["catalog"] = df["catalog"]
+        new_df["extracted_product"] = df["extracted_product"].map(product_to_json)
+        new_df["catalog"] = pd.Categorical(df["catalog"])
         new_df["product_group_id"] = df["product_group_id"]
 
-    # Verify all values are strings before returning
-    if not new_df["extracted_product"].apply(lambda x: isinstance(x, str)).all():
-        logger.error("Some extracted_product values are not strings!")
-        non_string_samples = new_df[
-            ~new_df["extracted_product"].apply(lambda x: isinstance(x, str))
-        ]["extracted_product"].head()
-        logger.error(f"Non-string samples: {non_string_samples}")
-        # Force conversion to string
-        new_df["extracted_product"] = new_df["extracted_product"].apply(
-            lambda x: json.dumps(x, cls=NumpyEncoder) if not isinstance(x, str) else x
+    return new_df
+
+
+def product_source_sql(
+    conn: duckdb.DuckDBPyConnection, parquet_files: list[str], is_flattened: bool
+) -> str:
+    """
+    Build a SELECT over parquet files that yields catalog and extracted_product,
+    along with the filename and file_row_number each row was read from.
+
+    The JSON for extracted_product is produced by DuckDB: flattened files have
+    every column packed into a struct, nested files have their struct column
+    converted (string columns are assumed to already hold JSON).
+    """
+    file_list = ", ".join(quote_literal(f) for f in parquet_files)
+    source = f"read_parquet([{file_list}], union_by_name = true)"
+    columns = conn.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+
+    if is_flattened:
+        fields = ", ".join(
+            f"{quote_identifier(name)} := {quote_identifier(name)}"
+            for name, *_ in columns
         )
+        extracted_product = f"to_json(struct_pack({fields}))"
+    else:
+        column_types = {name: column_type for name, column_type, *_ in columns}
+        if column_types.get("extracted_product") in ("VARCHAR", "JSON"):
+            extracted_product = "extracted_product"
+        else:
+            extracted_product = "to_json(extracted_product)"
+
+    return f"""
+        SELECT
+            catalog,
+            {extracted_product} as extracted_product,
+            filename,
+            file_row_number
+        FROM read_parquet(
+            [{file_list}], union_by_name = true, filename = true, file_row_number = true
+        )
+    """
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a column name for use in DuckDB SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value: str) -> str:
+    """Quote a string literal (e.g. a file path) for use in DuckDB SQL."""
+    return "'" + value.replace("'", "''") + "'"
 
-    return new_df
+
+def drop_table_or_view(conn: duckdb.DuckDBPyConnection, name: str) -> None:
+    """Drop the table or view with the given name, if one exists."""
+    row = conn.execute(
+        "SELECT table_type FROM information_schema.tables WHERE table_name = ?",
+        [name],
+    ).fetchone()
+    if row:
+        conn.execute(f"DROP {'VIEW' if row[0] == 'VIEW' else 'TABLE'} {name}")
+
+
+def configure_gcs_access(
+    conn: duckdb.DuckDBPyConnection, key_id: str, secret: str
+) -> None:
+    """Let `conn` read gs:// URLs directly, authenticating with a GCS HMAC key."""
+    conn.execute("INSTALL httpfs")
+    conn.execute("LOAD httpfs")
+    conn.execute(f"""
+        CREATE OR REPLACE TEMPORARY SECRET octogen_gcs (
+            TYPE GCS,
+            KEY_ID {quote_literal(key_id)},
+            SECRET {quote_literal(secret)}
+        )
+    """)
 
 
 def load_to_duckdb(
@@ -84,86 +241,48 @@ def load_to_duckdb(
     duplicates_skipped = 0
 
     if parquet_files:
-        # Read first file and create table, converting struct columns to JSON
+        # Scan all files at once so DuckDB can parallelize the read across them
         conn.execute(f"""
-            CREATE TEMP VIEW first_df AS 
-            SELECT 
-                catalog,
-                to_json(extracted_product) as extracted_product,
-                created_at,
-                updated_at
-            FROM read_parquet('{parquet_files[0]}')
+            CREATE OR REPLACE TEMP VIEW raw_products AS
+            {product_source_sql(conn, parquet_files, is_flattened)}
         """)
 
-        # Count total records in first file
-        file_total = conn.execute("SELECT COUNT(*) FROM first_df").fetchone()[0]
+        # Count total records across all files
+        file_total = conn.execute("SELECT COUNT(*) FROM raw_products").fetchone()[0]
 
-        # Drop existing tables if they exist
-        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        # Drop existing tables if they exist ({table_name} is a table in older databases)
+        drop_table_or_view(conn, table_name)
         conn.execute(f"DROP TABLE IF EXISTS {table_name}_extracted")
 
-        # Create temporary table for initial data
-        conn.execute("DROP TABLE IF EXISTS temp_first")
-        conn.execute("""
-            CREATE TEMPORARY TABLE temp_first AS 
-            SELECT 
-                catalog,
-                -- Store extracted_product as is (already JSON string)
-                extracted_product,
-                json_extract_string(extracted_product, 'productGroupID') as product_group_id,
-                -- Pre-extract commonly used fields
-                json_extract_string(extracted_product, 'id') as product_id,
-                json_extract_string(extracted_product, '$.brand.name') as brand_name,
-                json_extract_string(extracted_product, 'name') as name,
-                json_extract_string(extracted_product, 'description') as description,
-                json_extract_string(extracted_product, 'image') as product_image,
-                -- Extract price from first variant's first offer's priceSpecification
-                TRY_CAST(
-                    json_extract_string(
-                        extracted_product,
-                        '$.hasVariant[0].offers[0].priceSpecification.price'
-                    )
-                AS FLOAT) as price,
-                -- Extract original price (if available) from first variant's first offer
-                TRY_CAST(
-                    json_extract_string(
-                        extracted_product,
-                        '$.hasVariant[0].offers[0].priceSpecification.originalPrice'
-                    )
-                AS FLOAT) as original_price,
-                -- Extract rating information
-                TRY_CAST(
-                    json_extract_string(extracted_product, '$.review[0].reviewRating.ratingValue')
-                AS FLOAT) as rating,
-                TRY_CAST(
-                    json_extract_string(extracted_product, '$.review[0].reviewRating.ratingCount')
-                AS INTEGER) as rating_count
-            FROM first_df
-            WHERE json_extract_string(extracted_product, 'productGroupID') IS NOT NULL
-        """)
-
         # Create main table with deduplicated data and extracted fields
         conn.execute(f"""
-            CREATE TABLE {table_name}_extracted AS 
-            SELECT DISTINCT ON (product_group_id) *
-            FROM temp_first
+            CREATE TABLE {table_name}_extracted AS
+            SELECT * EXCLUDE (filename, file_row_number)
+            FROM ({EXTRACTED_PRODUCTS_SQL})
             WHERE product_group_id IS NOT NULL
-            ORDER BY product_group_id, extracted_product
+            -- Keep one row per product group, deduplicating across all files: the
+            -- first row of the first file (in sorted path order) holding it wins.
+            -- Ordering on file position avoids sorting the JSON blobs.
+            QUALIFY row_number() OVER (
+                PARTITION BY product_group_id ORDER BY filename, file_row_number
+            ) = 1
         """)
 
-        # Create original table with just the raw JSON for backwards compatibility
+        # Expose just the raw JSON under the original table name for backwards
+        # compatibility, without storing a second copy of extracted_product
         conn.execute(f"""
-            CREATE TABLE {table_name} AS 
+            CREATE VIEW {table_name} AS
             SELECT product_group_id, extracted_product
             FROM {table_name}_extracted
         """)
 
-        initial_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-        duplicates_skipped += file_total - initial_count
-        total_products += initial_count
+        total_products = conn.execute(
+            f"SELECT COUNT(*) FROM {table_name}_extracted"
+        ).fetchone()[0]
+        duplicates_skipped = file_total - total_products
 
         logger.info(
-            f"Created tables {table_name} and {table_name}_extracted with schema from first file ({initial_count} products, {file_total - initial_count} duplicates skipped)"
+            f"Created table {table_name}_extracted and view {table_name} from {len(parquet_files)} files ({total_products} products, {duplicates_skipped} duplicates skipped)"
         )
 
         # Add unique index
@@ -172,193 +291,136 @@ def load_to_duckdb(
             ON {table_name}_extracted (product_group_id)
         """)
 
-        # Append remaining files
-        for parquet_file in parquet_files[1:]:
-            logger.info(f"Loading {parquet_file} into tables")
-            try:
-                # Create view from parquet file
-                conn.execute(f"""
-                    CREATE VIEW df AS 
-                    SELECT * FROM read_parquet('{parquet_file}')
-                """)
-
-                file_total = conn.execute("SELECT COUNT(*) FROM df").fetchone()[0]
-
-                # Create temporary table with extracted fields
-                conn.execute("DROP TABLE IF EXISTS temp_products")
-                conn.execute("""
-                    CREATE TEMPORARY TABLE temp_products AS 
-                    SELECT 
-                        catalog,
-                        -- Store extracted_product as is (already JSON string)
-                        extracted_product,
-                        json_extract_string(extracted_product, 'productGroupID') as product_group_id,
-                        json_extract_string(extracted_product, 'id') as product_id,
-                        json_extract_string(extracted_product, '$.brand.name') as brand_name,
-                        json_extract_string(extracted_product, 'name') as name,
-                        json_extract_string(extracted_product, 'description') as description,
-                        json_extract_string(extracted_product, 'image') as product_image,
-                        -- Extract price from first variant's first offer's priceSpecification
-                        TRY_CAST(
-                            json_extract_string(
-                                extracted_product,
-                                '$.hasVariant[0].offers[0].priceSpecification.price'
-                            )
-                        AS FLOAT) as price,
-                        -- Extract original price (if available) from first variant's first offer
-                        TRY_CAST(
-                            json_extract_string(
-                                extracted_product,
-                                '$.hasVariant[0].offers[0].priceSpecification.originalPrice'
-                            )
-                        AS FLOAT) as original_price,
-                        -- Extract rating information
-                        TRY_CAST(
-                            json_extract_string(extracted_product, '$.review[0].reviewRating.ratingValue')
-                        AS FLOAT) as rating,
-                        TRY_CAST(
-                            json_extract_string(extracted_product, '$.review[0].reviewRating.ratingCount')
-                        AS INTEGER) as rating_count
-                    FROM df
-                    WHERE json_extract_string(extracted_product, 'productGroupID') IS NOT NULL
-                """)
-
-                # Count records before insertion
-                pre_count = conn.execute(
-                    f"SELECT COUNT(*) FROM {table_name}"
-                ).fetchone()[0]
-
-                # Modified insertion logic to handle duplicates gracefully
-                conn.execute(f"""
-                    BEGIN TRANSACTION;
-                    
-                    -- Insert into extracted table
-                    INSERT INTO {table_name}_extracted
-                    SELECT t.* 
-                    FROM (
-                        SELECT DISTINCT ON (product_group_id) *
-                        FROM temp_products
-                        ORDER BY product_group_id, extracted_product
-                    ) t
-                    WHERE NOT EXISTS (
-                        SELECT 1 
-                        FROM {table_name}_extracted m 
-                        WHERE m.product_group_id = t.product_group_id
-                    );
-
-                    -- Insert into main table
-                    INSERT INTO {table_name}
-                    SELECT DISTINCT product_group_id, extracted_product
-                    FROM temp_products t
-                    WHERE NOT EXISTS (
-                        SELECT 1 
-                        FROM {table_name} m 
-                        WHERE m.product_group_id = t.product_group_id
-                    );
-                    
-                    COMMIT;
-                """)
-
-                # Count records after insertion
-                post_count = conn.execute(
-                    f"SELECT COUNT(*) FROM {table_name}"
-                ).fetchone()[0]
-                inserted = post_count - pre_count
-                duplicates_skipped += file_total - inserted
-                total_products += inserted
-
-                logger.info(
-                    f"Successfully loaded {inserted} rows ({file_total - inserted} duplicates skipped)"
-                )
-
-                # Drop the view after processing
-                conn.execute("DROP VIEW IF EXISTS df")
-
-            except Exception as e:
-                logger.error(f"Error loading {parquet_file}: {str(e)}")
-                # Make sure to drop the view even if there's an error
-                conn.execute("DROP VIEW IF EXISTS df")
-                continue
-
-        # Clean up temporary tables
-        conn.execute("DROP TABLE IF EXISTS temp_first")
-        conn.execute("DROP TABLE IF EXISTS temp_products")
+        # Clean up temporary view
+        conn.execute("DROP VIEW IF EXISTS raw_products")
 
     return total_products, duplicates_skipped
 
 
+@contextmanager
+def transaction(conn: duckdb.DuckDBPyConnection) -> Iterator[None]:
+    """Run the enclosed statements in one transaction, rolling back on error."""
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def find_parquet_files(download_path: str) -> list[str]:
+    """Recursively list the (non-hidden) parquet files under a directory, sorted."""
+    return sorted(
+        str(path)
+        for path in Path(download_path).rglob("*.parquet")
+        if not path.name.startswith(".")
+    )
+
+
 def load_products_to_db(
     download_path: str,
     catalog: str,
     create_if_missing: bool = False,
-) -> None:
-    """Load product parquet files into DuckDB database."""
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
+) -> bool:
+    """
+    Load product parquet files into DuckDB database.
+
+    `download_path` may also be a gs:// URL, in which case DuckDB reads the
+    parquet files straight from GCS; `conn` must then have been set up with
+    configure_gcs_access. If `conn` is given it is used instead of opening the
+    catalog database, and is left open.
+
+    Returns False if there were no parquet files to load.
+    """
     logger.info(
         f"Loading product parquet files from {download_path} for catalog {catalog}"
     )
-    db_path = get_catalog_db_path(catalog, raise_if_not_found=not create_if_missing)
-    logger.debug(f"Using database path: {db_path}")
+    owns_connection = conn is None
+    if owns_connection:
+        db_path = get_catalog_db_path(catalog, raise_if_not_found=not create_if_missing)
+        logger.debug(f"Using database path: {db_path}")
 
-    # Connect to database
-    conn = duckdb.connect(db_path, config={"allow_unsigned_extensions": "true"})
+        # Connect to database
+        conn = duckdb.connect(db_path, config=DUCKDB_CONFIG)
 
     table_name = f"{os.path.splitext(catalog)[0].replace(os.sep, '_')}"
-    parquet_files = glob.glob(
-        os.path.join(download_path, "**/*.parquet"), recursive=True
-    )
+    is_remote = download_path.startswith("gs://")
+    if is_remote:
+        # DuckDB expands the glob against the bucket itself
+        parquet_files = [f"{download_path.rstrip('/')}/**/*.parquet"]
+    else:
+        parquet_files = find_parquet_files(download_path)
 
     try:
         if not parquet_files:
             logger.error(f"No parquet files found in {download_path}")
-            return
+            return False
 
-        first_df = pd.read_parquet(parquet_files[0])
-        is_flattened = is_data_flattened(first_df)
+        if is_remote:
+            is_flattened = is_parquet_source_flattened(conn, parquet_files[0])
+        else:
+            is_flattened = is_parquet_file_flattened(parquet_files[0])
         logger.info(f"Detected {'flattened' if is_flattened else 'nested'} data format")
 
-        total_products, duplicates_skipped = load_to_duckdb(
-            conn, parquet_files, table_name, is_flattened
-        )
+        # Load in a single transaction so a failure leaves the previous tables intact
+        with transaction(conn):
+            total_products, duplicates_skipped = load_to_duckdb(
+                conn, parquet_files, table_name, is_flattened
+            )
         logger.info("Finished loading all product parquet files to DuckDB database.")
         logger.info(f"Total products loaded: {total_products}")
         logger.info(f"Duplicate records skipped: {duplicates_skipped}")
+        return True
     finally:
-        conn.close()
+        if owns_connection:
+            conn.close()
 
 
 def load_crawls_to_db(
     download_path: str,
     catalog: str,
     create_if_missing: bool = False,
+    conn: Optional[duckdb.DuckDBPyConnection] = None,
 ) -> None:
-    """Load crawl data parquet files into DuckDB database."""
+    """
+    Load crawl data parquet files into DuckDB database.
+
+    If `conn` is given it is used instead of opening the catalog database, and is
+    left open.
+    """
     logger.info(
         f"Loading crawl data parquet files from {download_path} for catalog {catalog}"
     )
-    db_path = get_catalog_db_path(catalog, raise_if_not_found=not create_if_missing)
-    logger.debug(f"Using database path: {db_path}")
+    owns_connection = conn is None
+    if owns_connection:
+        db_path = get_catalog_db_path(catalog, raise_if_not_found=not create_if_missing)
+        logger.debug(f"Using database path: {db_path}")
 
-    # Connect to database
-    conn = duckdb.connect(db_path, config={"allow_unsigned_extensions": "true"})
+        # Connect to database
+        conn = duckdb.connect(db_path, config=DUCKDB_CONFIG)
 
     table_name = f"{os.path.splitext(catalog)[0].replace(os.sep, '_')}_crawls"
-    parquet_files = glob.glob(
-        os.path.join(download_path, "**/*.parquet"), recursive=True
-    )
+    parquet_files = find_parquet_files(download_path)
 
     try:
         if not parquet_files:
             logger.error(f"No parquet files found in {download_path}")
             return
 
-        total_records, duplicates_skipped = load_crawl_data_to_duckdb(
-            conn, parquet_files, table_name
-        )
+        # Load all files in a single transaction so the WAL is flushed once, not per
+        # file; a failed insert rolls back the whole load
+        with transaction(conn):
+            total_records, duplicates_skipped = load_crawl_data_to_duckdb(
+                conn, parquet_files, table_name
+            )
         logger.info("Finished loading all crawl data parquet files to DuckDB database.")
         logger.info(f"Total records loaded: {total_records}")
         logger.info(f"Duplicate records skipped: {duplicates_skipped}")
     finally:
-        conn.close()
+        if owns_connection:
+            conn.close()
 
 
 def main() -> None:
@@ -408,6 +470,30 @@ def is_data_flattened(df: pd.DataFrame) -> bool:
     return True
 
 
+def is_parquet_file_flattened(parquet_file: str) -> bool:
+    """
+    Determine if a parquet file contains flattened data, like is_data_flattened,
+    but reading only the schema from the file footer instead of the whole file.
+
+    Returns:
+        bool: True if data appears to be flattened, False otherwise
+    """
+    return "extracted_product" not in pq.read_schema(parquet_file).names
+
+
+def is_parquet_source_flattened(
+    conn: duckdb.DuckDBPyConnection, parquet_source: str
+) -> bool:
+    """
+    Like is_parquet_file_flattened, for parquet files DuckDB reads itself (e.g. a
+    gs:// glob), using only the schema from their footers.
+    """
+    columns = conn.execute(
+        f"DESCRIBE SELECT * FROM read_parquet({quote_literal(parquet_source)})"
+    ).fetchall()
+    return "extracted_product" not in {name for name, *_ in columns}
+
+
 def load_crawl_data_to_duckdb(
     conn: duckdb.DuckDBPyConnection,
     parquet_files: list[str],
@@ -420,14 +506,10 @@ def load_crawl_data_to_duckdb(
     if not parquet_files:
         return total_records, duplicates_skipped
 
-    # Read first file and create table
-    first_df = pd.read_parquet(parquet_files[0])
-    file_total = len(first_df)
-
     # Drop existing table if it exists
     conn.execute(f"DROP TABLE IF EXISTS {table_name}")
 
-    # Create table with initial data - removed crawl_url from uniqueness constraints
+    # Create table - crawls are deduplicated on crawl_timestamp during the insert
     conn.execute(f"""
         CREATE TABLE {table_name} (
             crawl_id INTEGER PRIMARY KEY,
@@ -444,8 +526,18 @@ def load_crawl_data_to_duckdb(
         CREATE SEQUENCE IF NOT EXISTS {table_name}_id_seq;
     """)
 
-    # Modified initial data insertion - only using timestamp for ordering
-    conn.execute(f"""
+    logger.info(f"Created table {table_name}")
+
+    # Read every file in one scan so DuckDB parallelizes across files and row
+    # groups; only the listed columns are read from the parquet files
+    file_list = ", ".join(quote_literal(f) for f in parquet_files)
+    source = f"read_parquet([{file_list}], union_by_name = true, filename = true)"
+    file_total = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+
+    # Crawls are deduplicated on crawl_timestamp: every row for a timestamp from
+    # the first file (in sorted path order) that contains it is kept, later files'
+    # rows are skipped; NULL timestamps are all kept
+    total_records = conn.execute(f"""
         INSERT INTO {table_name} (
             crawl_id,
             catalog,
@@ -459,30 +551,28 @@ def load_crawl_data_to_duckdb(
         )
         SELECT 
             nextval('{table_name}_id_seq'),
-            catalog,
-            product_url,
-            crawl_url,
-            page_content,
-            crawl_timestamp,
-            crawl_source,
-            api_source,
-            octogen_catalog
+            t.catalog,
+            t.product_url,
+            t.crawl_url,
+            t.page_content,
+            t.crawl_timestamp,
+            t.crawl_source,
+            t.api_source,
+            t.octogen_catalog
         FROM (
-            SELECT *
-            FROM first_df
-            ORDER BY crawl_timestamp DESC
-        );
-    """)
-
-    initial_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-    duplicates_skipped += file_total - initial_count
-    total_records += initial_count
+            SELECT {", ".join(CRAWL_COLUMNS)}
+            FROM {source}
+            QUALIFY crawl_timestamp IS NULL
+                OR filename = min(filename) OVER (PARTITION BY crawl_timestamp)
+        ) t
+    """).fetchone()[0]
+    duplicates_skipped = file_total - total_records
 
     logger.info(
-        f"Created table {table_name} with schema from first file ({initial_count} records, {file_total - initial_count} duplicates skipped)"
+        f"Loaded {total_records} rows from {len(parquet_files)} files ({duplicates_skipped} duplicates skipped)"
     )
 
-    # Create indexes for better query performance
+    # Create indexes for better query performance once the bulk load is done
     conn.execute(f"""
         CREATE INDEX IF NOT EXISTS idx_{table_name}_crawl_url 
         ON {table_name} (crawl_url)
@@ -492,65 +582,6 @@ def load_crawl_data_to_duckdb(
         ON {table_name} (crawl_timestamp)
     """)
 
-    # Append remaining files
-    for parquet_file in parquet_files[1:]:
-        logger.info(f"Loading {parquet_file}")
-        try:
-            df = pd.read_parquet(parquet_file)
-            file_total = len(df)
-
-            # Count records before insertion
-            pre_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-
-            # Modified insert query - removed crawl_url uniqueness check
-            conn.execute(f"""
-                INSERT INTO {table_name} (
-                    crawl_id,
-                    catalog,
-                    product_url,
-                    crawl_url,
-                    page_content,
-                    crawl_timestamp,
-                    crawl_source,
-                    api_source,
-                    octogen_catalog
-                )
-                SELECT 
-                    nextval('{table_name}_id_seq'),
-                    t.catalog,
-                    t.product_url,
-                    t.crawl_url,
-                    t.page_content,
-                    t.crawl_timestamp,
-                    t.crawl_source,
-                    t.api_source,
-                    t.octogen_catalog
-                FROM (
-                    SELECT *
-                    FROM df
-                    ORDER BY crawl_timestamp DESC
-                ) t
-                WHERE NOT EXISTS (
-                    SELECT 1 
-                    FROM {table_name} m 
-                    WHERE m.crawl_timestamp = t.crawl_timestamp
-                );
-            """)
-
-            # Count records after insertion
-            post_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[
-                0
-            ]
-            inserted = post_count - pre_count
-            duplicates_skipped += file_total - inserted
-            total_records += inserted
-
-            logger.info(
-                f"Successfully loaded {inserted} rows ({file_total - inserted} duplicates skipped)"
-            )
-        except Exception as e:
-            logger.error(f"Error loading {parquet_file}: {str(e)}")
-
     return total_records, duplicates_skipped
 
 
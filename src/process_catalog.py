@@ -3,15 +3,26 @@ import asyncio
 import os
 from typing import Optional
 
+import duckdb
 import structlog
+from asyncer import asyncify
 from dotenv import load_dotenv
 
 import load_to_db
 
 # Import functions from existing scripts
-from download_catalog_files import download_catalog
-from index_catalog import create_whoosh_index
-from utils import configure_logging, get_catalog_db_path, get_latest_snapshot_path
+from download_catalog_files import download_catalog, find_latest_snapshot_url
+from index_catalog import (
+    DEFAULT_INDEX_BATCH_BYTES,
+    create_whoosh_index,
+    estimate_batch_size,
+)
+from utils import (
+    configure_logging,
+    get_catalog_db_path,
+    get_latest_snapshot_path,
+    run_async_main,
+)
 
 # Configure logging
 configure_logging(debug=False, log_to_console=True)
@@ -22,18 +33,50 @@ async def process_catalog(
     catalog: str,
     download_to: str,
     index_dir: Optional[str] = None,
-    batch_size: int = 1000,
+    batch_size: Optional[int] = None,
     read_from_local_files: bool = False,
     crawl_sources_dir: Optional[str] = None,
+    force_download: bool = False,
+    duckdb_memory_limit: Optional[str] = None,
+    duckdb_threads: Optional[int] = None,
+    duckdb_temp_dir: Optional[str] = None,
+    index_batch_bytes: int = DEFAULT_INDEX_BATCH_BYTES,
+    read_from_gcs: bool = False,
 ) -> None:
-    """Process a catalog through all three steps: download, load to DB, and index."""
+    """Process a catalog through all three steps: download, load to DB, and index.
+
+    Unless batch_size is given, indexing batches are sized so that each holds
+    roughly index_batch_bytes of product JSON. With read_from_gcs, the latest
+    snapshot is loaded straight from the bucket instead of being downloaded
+    first; this needs a GCS HMAC key in OCTOGEN_GCS_HMAC_KEY_ID and
+    OCTOGEN_GCS_HMAC_SECRET.
+    """
     octogen_catalog_bucket = os.getenv("OCTOGEN_CATALOG_BUCKET_NAME")
     octogen_customer_name = os.getenv("OCTOGEN_CUSTOMER_NAME")
     original_download_to: str = download_to
     # Ensure download_to ends with catalog={catalog}
     try:
         # Step 1: Download catalog
-        if read_from_local_files:
+        products_source: Optional[str] = None
+        if read_from_gcs:
+            products_source = await find_latest_snapshot_url(
+                octogen_catalog_bucket=octogen_catalog_bucket,
+                octogen_customer_name=octogen_customer_name,
+                catalog=catalog,
+            )
+            if products_source is None:
+                raise ValueError(f"No snapshots found for catalog {catalog}")
+            # Where a download would have put the snapshot, so crawled sources are
+            # still found relative to it
+            download_to = os.path.join(
+                download_to,
+                products_source.removeprefix(f"gs://{octogen_catalog_bucket}/"),
+            ).rstrip("/")
+
+            logger.info(
+                f"Step 1: Reading catalog {catalog} directly from {products_source}"
+            )
+        elif read_from_local_files:
             # Find the latest snapshot directory
             download_to = get_latest_snapshot_path(download_to)
             if not download_to:
@@ -49,40 +92,97 @@ async def process_catalog(
                 octogen_customer_name=octogen_customer_name,
                 catalog=catalog,
                 download_path=download_to,
+                force=force_download,
             )
-        # Only modify path if no parquet files found in current download_to
-        if not any(f.endswith(".parquet") for f in os.listdir(download_to)):
-            expected_catalog_suffix = f"catalog={catalog}"
-            if not download_to.endswith(expected_catalog_suffix):
-                download_to = os.path.join(
-                    download_to, octogen_customer_name, expected_catalog_suffix
-                )
-        download_to = get_latest_snapshot_path(download_to)
+        if products_source is None:
+            # Only modify path if no parquet files found in current download_to
+            if not any(f.endswith(".parquet") for f in os.listdir(download_to)):
+                expected_catalog_suffix = f"catalog={catalog}"
+                if not download_to.endswith(expected_catalog_suffix):
+                    download_to = os.path.join(
+                        download_to, octogen_customer_name, expected_catalog_suffix
+                    )
+            download_to = get_latest_snapshot_path(download_to)
+            products_source = download_to
 
         # Step 2: Load to database
         logger.info(
-            f"Step 2: Loading catalog {catalog} to DuckDB database. From parquet files in {download_to}"
+            f"Step 2: Loading catalog {catalog} to DuckDB database. From parquet files in {products_source}"
         )
         db_path = get_catalog_db_path(catalog, raise_if_not_found=False)
         logger.debug(f"Using database path: {db_path}")
-        load_to_db.load_products_to_db(download_to, catalog, create_if_missing=True)
-        if crawl_sources_dir:
-            print(f"crawl_sources_dir: {crawl_sources_dir}")
-            print(f"original_download_to: {original_download_to}")
-            print(f"download_to: {download_to}")
-            crawl_sources_dir = download_to.replace(
-                original_download_to, crawl_sources_dir
-            )
-            logger.info(
-                f"Step 2.1: Processing crawled sources in {crawl_sources_dir} and linking to catalog {catalog}"
-            )
-            load_to_db.load_crawls_to_db(
-                crawl_sources_dir, catalog, create_if_missing=True
+
+        # One connection, tuned from the command line, is shared by every stage;
+        # each stage runs on its own cursor since they run in separate threads
+        conn = duckdb.connect(
+            db_path,
+            config=load_to_db.duckdb_config(
+                memory_limit=duckdb_memory_limit,
+                threads=duckdb_threads,
+                temp_directory=duckdb_temp_dir,
+            ),
+        )
+
+        async def load_and_index_products() -> None:
+            with conn.cursor() as cursor:
+                loaded = await asyncify(load_to_db.load_products_to_db)(
+                    products_source, catalog, create_if_missing=True, conn=cursor
+                )
+            if not loaded:
+                # Nothing to index; the crawl load carries on regardless
+                logger.error(
+                    f"No products loaded for catalog {catalog}, skipping indexing"
+                )
+                return
+
+            # Step 3: Index the data
+            logger.info(f"Step 3: Indexing catalog {catalog}")
+            index_batch_size = batch_size
+            if index_batch_size is None:
+                with conn.cursor() as cursor:
+                    index_batch_size = await asyncify(estimate_batch_size)(
+                        cursor, catalog, index_batch_bytes
+                    )
+                logger.info(f"Using indexing batch size {index_batch_size}")
+            await asyncify(create_whoosh_index)(
+                db_path,
+                index_dir,
+                catalog,
+                index_batch_size,
+                conn=conn,
             )
-        # Step 3: Index the data
-        logger.info(f"Step 3: Indexing catalog {catalog}")
 
-        create_whoosh_index(db_path, index_dir, catalog, batch_size)
+        async def load_crawls(crawls_dir: str) -> None:
+            with conn.cursor() as cursor:
+                await asyncify(load_to_db.load_crawls_to_db)(
+                    crawls_dir, catalog, create_if_missing=True, conn=cursor
+                )
+
+        try:
+            if read_from_gcs:
+                load_to_db.configure_gcs_access(
+                    conn,
+                    key_id=os.environ["OCTOGEN_GCS_HMAC_KEY_ID"],
+                    secret=os.environ["OCTOGEN_GCS_HMAC_SECRET"],
+                )
+
+            # Crawled sources go to their own table, so they load while the
+            # products are loaded and indexed
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(load_and_index_products())
+                if crawl_sources_dir:
+                    print(f"crawl_sources_dir: {crawl_sources_dir}")
+                    print(f"original_download_to: {original_download_to}")
+                    print(f"download_to: {download_to}")
+                    crawl_sources_dir = download_to.replace(
+                        original_download_to, crawl_sources_dir
+                    )
+                    logger.info(
+                        f"Step 2.1: Processing crawled sources in {crawl_sources_dir} and linking to catalog {catalog}"
+                    )
+                    task_group.create_task(load_crawls(crawl_sources_dir))
+        finally:
+            conn.close()
 
         logger.info(f"Successfully processed catalog {catalog}")
 
@@ -112,7 +212,15 @@ async def main() -> None:
         help="Directory to store the Whoosh index (default: /tmp/whoosh/<catalog>)",
     )
     parser.add_argument(
-        "--batch_size", type=int, default=1000, help="Batch size for indexing"
+        "--batch_size",
+        type=int,
+        help="Batch size for indexing (default: derived from --index-batch-bytes)",
+    )
+    parser.add_argument(
+        "--index-batch-bytes",
+        type=int,
+        default=DEFAULT_INDEX_BATCH_BYTES,
+        help="Approximate bytes of product data per indexing batch (default: 50 MiB)",
     )
     parser.add_argument(
         "--local",
@@ -120,6 +228,34 @@ async def main() -> None:
         default=False,
         help="Read catalog from local files instead of downloading from GCS",
     )
+    parser.add_argument(
+        "--read-from-gcs",
+        action="store_true",
+        default=False,
+        help="Load the catalog into DuckDB straight from GCS instead of downloading it "
+        "first (requires OCTOGEN_GCS_HMAC_KEY_ID and OCTOGEN_GCS_HMAC_SECRET)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="Re-download catalog files even if an up-to-date local copy exists",
+    )
+    parser.add_argument(
+        "--duckdb-memory-limit",
+        type=str,
+        help="DuckDB memory limit for loading, e.g. 16GB (default: 80%% of RAM)",
+    )
+    parser.add_argument(
+        "--duckdb-threads",
+        type=int,
+        help="Number of DuckDB threads for loading (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--duckdb-temp-dir",
+        type=str,
+        help="Directory DuckDB spills to when a load exceeds the memory limit",
+    )
     parser.add_argument(
         "--crawl-sources-dir",
         type=str,
@@ -134,6 +270,17 @@ async def main() -> None:
         )
         return
 
+    if args.read_from_gcs and not (
+        os.getenv("OCTOGEN_GCS_HMAC_KEY_ID") and os.getenv("OCTOGEN_GCS_HMAC_SECRET")
+    ):
+        logger.error(
+            "OCTOGEN_GCS_HMAC_KEY_ID and OCTOGEN_GCS_HMAC_SECRET must be set to read from GCS"
+        )
+        logger.error(
+            "Please see README.md for more information on how to set up the .env file."
+        )
+        return
+
     download_to: str = args.download
     if args.local:
         download_to = os.path.join(download_to, f"catalog={args.catalog}")
@@ -152,8 +299,14 @@ async def main() -> None:
         batch_size=args.batch_size,
         read_from_local_files=args.local,
         crawl_sources_dir=args.crawl_sources_dir,
+        force_download=args.force,
+        duckdb_memory_limit=args.duckdb_memory_limit,
+        duckdb_threads=args.duckdb_threads,
+        duckdb_temp_dir=args.duckdb_temp_dir,
+        index_batch_bytes=args.index_batch_bytes,
+        read_from_gcs=args.read_from_gcs,
     )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async_main(main)
@@ -1,27 +1,48 @@
-import glob
+import asyncio
 import logging
 import os
 import sys
-from typing import Any, Callable, List, MutableMapping
+from typing import Any, Callable, Coroutine, List, MutableMapping
 
 import structlog
 from fastapi import HTTPException
 from structlog.processors import CallsiteParameter
 
 
+def run_async_main(main: Callable[[], Coroutine[Any, Any, None]]) -> None:
+    """Run an async entry point, on uvloop's event loop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        asyncio.run(main(), loop_factory=uvloop.new_event_loop)
+
+
 def get_latest_snapshot_path(folder: str) -> str:
     # If the folder itself is a snapshot, return it
     if os.path.basename(folder).startswith("snapshot="):
         return folder
 
-    # Otherwise, look for snapshot subdirectories
-    snapshot_pattern = os.path.join(folder, "snapshot=*")
-    snapshot_dirs = sorted(glob.glob(snapshot_pattern), reverse=True)
-
-    if not snapshot_dirs:
+    # Otherwise, pick the latest snapshot subdirectory in a single directory read;
+    # snapshot names sort chronologically
+    try:
+        with os.scandir(folder) as entries:
+            latest_snapshot = max(
+                (
+                    entry.name
+                    for entry in entries
+                    if entry.name.startswith("snapshot=") and entry.is_dir()
+                ),
+                default=None,
+            )
+    except FileNotFoundError:
+        latest_snapshot = None
+
+    if latest_snapshot is None:
         raise ValueError(f"No snapshot directories found in {folder}")
 
-    return snapshot_dirs[0]
+    return os.path.join(folder, latest_snapshot)
 
 
 def get_catalog_db_path(table_name: str, raise_if_not_found: bool = True) -> str:
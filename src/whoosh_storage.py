@@ -0,0 +1,115 @@
+import mmap
+import os
+from typing import Any, Callable, Optional
+
+from whoosh.filedb.filestore import FileStorage
+from whoosh.filedb.structfile import BufferFile, StructFile
+
+
+class MemoryViewReader:
+    """Read-only file object over a memoryview. Reads copy only the bytes asked for."""
+
+    def __init__(self, buf: memoryview):
+        self._buf = buf
+        self._pos = 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._buf)
+        if size is not None and size >= 0:
+            end = min(self._pos + size, end)
+        start, self._pos = self._pos, max(self._pos, end)
+        return self._buf[start:end].tobytes()
+
+    def readline(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._buf)
+        if size is not None and size >= 0:
+            end = min(self._pos + size, end)
+        # Scan forward in small chunks so a line never copies the whole buffer
+        pos = self._pos
+        while pos < end:
+            chunk_end = min(pos + 256, end)
+            newline = self._buf[pos:chunk_end].tobytes().find(b"\n")
+            if newline >= 0:
+                end = pos + newline + 1
+                break
+            pos = chunk_end
+        return self.read(end - self._pos)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._buf)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryViewFile(BufferFile):
+    """
+    Whoosh BufferFile backed by a memoryview instead of a BytesIO copy of it.
+
+    Sub-files of a compound segment are slices of the parent's view, so opening
+    them copies nothing either.
+    """
+
+    def __init__(
+        self,
+        buf: memoryview,
+        name: Optional[str] = None,
+        onclose: Optional[Callable[[StructFile], None]] = None,
+        mapping: Optional[mmap.mmap] = None,
+    ) -> None:
+        self._buf = buf
+        self._name = name
+        self.file = MemoryViewReader(buf)
+        self.onclose = onclose
+        self._mapping = mapping
+
+        self.is_real = False
+        self.is_closed = False
+
+    def subset(
+        self, position: int, length: int, name: Optional[str] = None
+    ) -> "MemoryViewFile":
+        return MemoryViewFile(
+            self._buf[position : position + length], name=name or self._name
+        )
+
+    def close(self) -> None:
+        super().close()
+        if self._mapping is not None:
+            self._buf.release()
+            try:
+                self._mapping.close()
+            except BufferError:
+                # Sub-files still hold views of the map; it is unmapped once
+                # they are garbage collected
+                pass
+
+
+class MemoryViewStorage(FileStorage):
+    """
+    FileStorage that memory-maps each file it opens and reads it through a
+    memoryview.
+
+    Whoosh's own mmap support wraps every sub-file of a compound segment in a
+    BytesIO, copying it into memory; here reads slice the map directly.
+    """
+
+    def __init__(self, path: str, readonly: bool = False, debug: bool = False):
+        # Without mmap support CompoundStorage splits segments via subset()
+        super().__init__(path, supports_mmap=False, readonly=readonly, debug=debug)
+
+    def open_file(self, name: str, **kwargs: Any) -> StructFile:
+        with open(self._fpath(name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files cannot be memory-mapped
+                return super().open_file(name, **kwargs)
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return MemoryViewFile(memoryview(mapping), name=name, mapping=mapping, **kwargs)